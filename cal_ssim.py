@@ -14,16 +14,24 @@ def create_window(window_size, channel):
     window = Variable(_2D_window.expand(channel, 1, window_size, window_size).contiguous())
     return window
 
+def _target_stats(img2, window, window_size, channel):
+    mu2 = F.conv2d(img2, window, padding = window_size//2, groups = channel)
+    mu2_sq = mu2.pow(2)
+    sigma2_sq = F.conv2d(img2*img2, window, padding = window_size//2, groups = channel) - mu2_sq
+    return img2, mu2, mu2_sq, sigma2_sq
+
 def _ssim(img1, img2, window, window_size, channel, size_average = True):
+    # img2 is either the target image or its precomputed _target_stats
+    if not isinstance(img2, tuple):
+        img2 = _target_stats(img2, window, window_size, channel)
+    img2, mu2, mu2_sq, sigma2_sq = img2
+
     mu1 = F.conv2d(img1, window, padding = window_size//2, groups = channel)
-    mu2 = F.conv2d(img2, window, padding = window_size//2, groups = channel)
 
     mu1_sq = mu1.pow(2)
-    mu2_sq = mu2.pow(2)
     mu1_mu2 = mu1*mu2
 
     sigma1_sq = F.conv2d(img1*img1, window, padding = window_size//2, groups = channel) - mu1_sq
-    sigma2_sq = F.conv2d(img2*img2, window, padding = window_size//2, groups = channel) - mu2_sq
     sigma12 = F.conv2d(img1*img2, window, padding = window_size//2, groups = channel) - mu1_mu2
 
     C1 = 0.01**2
@@ -44,24 +52,33 @@ class SSIM(torch.nn.Module):
         self.channel = 3
         self.window = create_window(window_size, self.channel)
 
-    def forward(self, img1, img2):
-        #print(img1.size())
-        (_, channel, _, _) = img1.size()
+    def get_window(self, img):
+        (_, channel, _, _) = img.size()
 
-        if channel == self.channel and self.window.data.type() == img1.data.type():
+        if channel == self.channel and self.window.data.type() == img.data.type():
             window = self.window
         else:
             window = create_window(self.window_size, channel)
             
-            if img1.is_cuda:
-                window = window.cuda(img1.get_device())
-            window = window.type_as(img1)
+            if img.is_cuda:
+                window = window.cuda(img.get_device())
+            window = window.type_as(img)
             
             self.window = window
             self.channel = channel
 
+        return window
 
-        return _ssim(img1, img2, window, self.window_size, channel, self.size_average)
+    def precompute_target(self, img2):
+        # reuse the target's blurred statistics across several forward calls
+        window = self.get_window(img2)
+        return _target_stats(img2, window, self.window_size, self.channel)
+
+    def forward(self, img1, img2):
+        #print(img1.size())
+        window = self.get_window(img1)
+
+        return _ssim(img1, img2, window, self.window_size, self.channel, self.size_average)
 
 def ssim(img1, img2, window_size = 11, size_average = True):
     (_, channel, _, _) = img1.size()
@@ -72,3 +89,11 @@ def ssim(img1, img2, window_size = 11, size_average = True):
     window = window.type_as(img1)
     
     return _ssim(img1, img2, window, window_size, channel, size_average)
+
+def psnr(img1, img2, clamp_target=True):
+    # clamped to [0, 1] like the old numpy PSNR; the result stays on the device.
+    # pass clamp_target=False when scoring several outputs against the same clamped target
+    if clamp_target:
+        img2 = img2.clamp(0, 1)
+    mse = torch.mean((img1.clamp(0, 1) - img2) ** 2)
+    return torch.where(mse == 0, torch.full_like(mse, 100), 20 * torch.log10(1. / torch.sqrt(mse)))
@@ -8,13 +8,15 @@ import settings
 import random
 
 class TrainValDataset(Dataset):
-    def __init__(self, name):
+    def __init__(self, name, pyramid=True):
         super().__init__()
         self.rand_state = RandomState(66)
         self.root_dir = name
         self.mat_files = sorted(os.listdir(self.root_dir))
         self.patch_size = settings.patch_size
         self.file_num = len(self.mat_files)
+        # set False when the caller builds O_2/O_4/B_2/B_4 itself on the GPU
+        self.pyramid = pyramid
 
         self.random_files = os.listdir(self.root_dir)
 
@@ -39,47 +41,45 @@ class TrainValDataset(Dataset):
             O, B = self.crop(img_pair, aug=False)
             O_random, B_random = self.crop(img_pair_random, aug=False)
 
+        if not self.pyramid:
+            sample = {'O': np.transpose(O, (2, 0, 1)), 'B': np.transpose(B, (2, 0, 1)), 'file_name':file_name[:-4],
+                      'O_random': np.transpose(O_random, (2, 0, 1)), 'B_random': np.transpose(B_random, (2, 0, 1)),
+                      'file_name_random':file_name_random[:-4]}
+            return sample
+
         O_2 = cv2.pyrDown(O)
         O_4 = cv2.pyrDown(O_2)
-        O_8 = cv2.pyrDown(O_4)
 
         B_2 = cv2.pyrDown(B)
         B_4 = cv2.pyrDown(B_2)
-        B_8 = cv2.pyrDown(B_4)
 
         O = np.transpose(O, (2, 0, 1))
         B = np.transpose(B, (2, 0, 1))
 
         O_2 = np.transpose(O_2, (2, 0, 1))
         O_4 = np.transpose(O_4, (2, 0, 1))
-        O_8 = np.transpose(O_8, (2, 0, 1))
 
         B_2 = np.transpose(B_2, (2, 0, 1))
         B_4 = np.transpose(B_4, (2, 0, 1))
-        B_8 = np.transpose(B_8, (2, 0, 1))
 
         O_2_random = cv2.pyrDown(O_random)
         O_4_random = cv2.pyrDown(O_2_random)
-        O_8_random = cv2.pyrDown(O_4_random)
 
         B_2_random = cv2.pyrDown(B_random)
         B_4_random = cv2.pyrDown(B_2_random)
-        B_8_random = cv2.pyrDown(B_4_random)
 
         O_random = np.transpose(O_random, (2, 0, 1))
         B_random = np.transpose(B_random, (2, 0, 1))
 
         O_2_random = np.transpose(O_2_random, (2, 0, 1))
         O_4_random = np.transpose(O_4_random, (2, 0, 1))
-        O_8_random = np.transpose(O_8_random, (2, 0, 1))
 
         B_2_random = np.transpose(B_2_random, (2, 0, 1))
         B_4_random = np.transpose(B_4_random, (2, 0, 1))
-        B_8_random = np.transpose(B_8_random, (2, 0, 1))
 
-        sample = {'O': O, 'B': B, 'O_2': O_2, 'O_4': O_4, 'O_8': O_8, 'B_2': B_2, 'B_4': B_4, 'B_8': B_8, 'file_name':file_name[:-4],
-                  'O_random': O_random, 'B_random': B_random, 'O_2_random': O_2_random, 'O_4_random': O_4_random, 'O_8_random': O_8_random,
-                  'B_2_random': B_2_random, 'B_4_random': B_4_random, 'B_8_random': B_8_random, 'file_name_random':file_name_random[:-4]}
+        sample = {'O': O, 'B': B, 'O_2': O_2, 'O_4': O_4, 'B_2': B_2, 'B_4': B_4, 'file_name':file_name[:-4],
+                  'O_random': O_random, 'B_random': B_random, 'O_2_random': O_2_random, 'O_4_random': O_4_random,
+                  'B_2_random': B_2_random, 'B_4_random': B_4_random, 'file_name_random':file_name_random[:-4]}
 
         return sample
 
@@ -124,12 +124,13 @@ class TrainValDataset(Dataset):
 
 
 class TestDataset(Dataset):
-    def __init__(self, name):
+    def __init__(self, name, pyramid=True):
         super().__init__()
         self.rand_state = RandomState(66)
         self.root_dir = name
         self.mat_files = os.listdir(self.root_dir)
         self.file_num = len(self.mat_files)
+        self.pyramid = pyramid
 
     def __len__(self):
         return self.file_num
@@ -143,27 +144,27 @@ class TestDataset(Dataset):
         O = img_pair[:, w:]
         B = img_pair[:, :w]
 
+        if not self.pyramid:
+            sample = {'O': np.transpose(O, (2, 0, 1)), 'B': np.transpose(B, (2, 0, 1)), 'file_name':file_name[:-4]}
+            return sample
+
         O_2 = cv2.pyrDown(O)
         O_4 = cv2.pyrDown(O_2)
-        O_8 = cv2.pyrDown(O_4)
 
         B_2 = cv2.pyrDown(B)
         B_4 = cv2.pyrDown(B_2)
-        B_8 = cv2.pyrDown(B_4)
 
         O = np.transpose(O, (2, 0, 1))
         B = np.transpose(B, (2, 0, 1))
 
         O_2 = np.transpose(O_2, (2, 0, 1))
         O_4 = np.transpose(O_4, (2, 0, 1))
-        O_8 = np.transpose(O_8, (2, 0, 1))
 
         B_2 = np.transpose(B_2, (2, 0, 1))
         B_4 = np.transpose(B_4, (2, 0, 1))
-        B_8 = np.transpose(B_8, (2, 0, 1))
         # print('file_name',file_name[:-4])
 
-        sample = {'O': O, 'B': B, 'O_2': O_2, 'O_4': O_4, 'O_8': O_8, 'B_2': B_2, 'B_4': B_4, 'B_8': B_8,'file_name':file_name[:-4]}
+        sample = {'O': O, 'B': B, 'O_2': O_2, 'O_4': O_4, 'B_2': B_2, 'B_4': B_4,'file_name':file_name[:-4]}
 
         return sample
 
@@ -3,7 +3,6 @@ import sys
 import cv2
 import argparse
 import numpy as np
-import math
 import torch
 from torch import nn
 from torch.nn import MSELoss
@@ -16,7 +15,7 @@ from tensorboardX import SummaryWriter
 import settings
 from dataset import TestDataset
 from model import ODE_DerainNet
-from cal_ssim import SSIM
+from cal_ssim import SSIM, psnr
 
 os.environ['CUDA_VISIBLE_DEVICES'] = settings.device_id
 logger = settings.logger
@@ -28,18 +27,6 @@ torch.manual_seed(66)
 def ensure_dir(dir_path):
     if not os.path.isdir(dir_path):
         os.makedirs(dir_path)
-def PSNR(img1, img2):
-    b,_,_,_=img1.shape
-    #mse=0
-    #for i in range(b):
-    img1=np.clip(img1,0,255)
-    img2=np.clip(img2,0,255)
-    mse = np.mean((img1/ 255. - img2/ 255.) ** 2)#+mse
-    if mse == 0:
-        return 100
-    #mse=mse/b
-    PIXEL_MAX = 1
-    return 20 * math.log10(PIXEL_MAX / math.sqrt(mse))        
 class Session:
     def __init__(self):
         self.log_dir = settings.log_dir
@@ -80,11 +67,9 @@ class Session:
         O, B = batch['O'].cuda(), batch['B'].cuda()
         O_2, B_2 = batch['O_2'].cuda(), batch['B_2'].cuda()
         O_4, B_4 = batch['O_4'].cuda(), batch['B_4'].cuda()
-        O_8, B_8 = batch['O_8'].cuda(), batch['B_8'].cuda()
         O, B = Variable(O, requires_grad=False), Variable(B, requires_grad=False)
         O_2, B_2 = Variable(O_2, requires_grad=False), Variable(B_2, requires_grad=False)
         O_4, B_4 = Variable(O_4, requires_grad=False), Variable(B_4, requires_grad=False)
-        O_8, B_8 = Variable(O_8, requires_grad=False), Variable(B_8, requires_grad=False)
 
 
         with torch.no_grad():
@@ -92,12 +77,12 @@ class Session:
 
         l1_loss = self.l1(derain, B)
         ssim = self.ssim(derain, B)
-        psnr = PSNR(derain.data.cpu().numpy() * 255, B.data.cpu().numpy() * 255)
+        psnr_val = psnr(derain, B).item()
         losses = { 'L1 loss' : l1_loss }
         ssimes = { 'ssim' : ssim }
         losses.update(ssimes)
 
-        return losses, psnr
+        return losses, psnr_val
 
 
 def run_test(ckp_name):
@@ -109,8 +94,8 @@ def run_test(ckp_name):
     all_num = 0
     all_losses = {}
     for i, batch in enumerate(dt):
-        losses,psnr= sess.inf_batch('test', batch)
-        psnr_all=psnr_all+psnr
+        losses,psnr_val= sess.inf_batch('test', batch)
+        psnr_all=psnr_all+psnr_val
         batch_size = batch['O'].size(0)
         all_num += batch_size
         for key, val in losses.items():
@@ -2,7 +2,6 @@ import os
 import sys
 import cv2
 import argparse
-import math
 
 import torch
 from torch import nn
@@ -16,7 +15,7 @@ from tensorboardX import SummaryWriter
 import settings
 from dataset import TrainValDataset, TestDataset
 from model import ODE_DerainNet
-from cal_ssim import SSIM
+from cal_ssim import SSIM, psnr
 
 logger = settings.logger
 os.environ['CUDA_VISIBLE_DEVICES'] = settings.device_id
@@ -31,18 +30,6 @@ def ensure_dir(dir_path):
         os.makedirs(dir_path)
 
 
-def PSNR(img1, img2):
-    b, _, _, _ = img1.shape
-    img1 = np.clip(img1, 0, 255)
-    img2 = np.clip(img2, 0, 255)
-    mse = np.mean((img1 / 255. - img2 / 255.) ** 2)
-    if mse == 0:
-        return 100
-
-    PIXEL_MAX = 1
-    return 20 * math.log10(PIXEL_MAX / math.sqrt(mse))
-
-
 class Session:
     def __init__(self):
         self.log_dir = settings.log_dir
@@ -159,25 +146,21 @@ class Session:
         if self.step == 0:
             self.print_network(self.net)
 
-        # sample = {'O': O, 'B': B, 'O_2': O_2, 'O_4': O_4, 'O_8': O_8, 'B_2': B_2, 'B_4': B_4, 'B_8': B_8}
+        # sample = {'O': O, 'B': B, 'O_2': O_2, 'O_4': O_4, 'B_2': B_2, 'B_4': B_4}
 
         O, B = batch['O'].cuda(), batch['B'].cuda()
         O_2, B_2 = batch['O_2'].cuda(), batch['B_2'].cuda()
         O_4, B_4 = batch['O_4'].cuda(), batch['B_4'].cuda()
-        O_8, B_8 = batch['O_8'].cuda(), batch['B_8'].cuda()
         O, B = Variable(O, requires_grad=False), Variable(B, requires_grad=False)
         O_2, B_2 = Variable(O_2, requires_grad=False), Variable(B_2, requires_grad=False)
         O_4, B_4 = Variable(O_4, requires_grad=False), Variable(B_4, requires_grad=False)
-        O_8, B_8 = Variable(O_8, requires_grad=False), Variable(B_8, requires_grad=False)
 
         O_random, B_random = batch['O_random'].cuda(), batch['B_random'].cuda()
         O_2_random, B_2_random = batch['O_2_random'].cuda(), batch['B_2_random'].cuda()
         O_4_random, B_4_random = batch['O_4_random'].cuda(), batch['B_4_random'].cuda()
-        O_8_random, B_8_random = batch['O_8_random'].cuda(), batch['B_8_random'].cuda()
         O_random, B_random = Variable(O_random, requires_grad=False), Variable(B_random, requires_grad=False)
         O_2_random, B_2_random = Variable(O_2_random, requires_grad=False), Variable(B_2_random, requires_grad=False)
         O_4_random, B_4_random = Variable(O_4_random, requires_grad=False), Variable(B_4_random, requires_grad=False)
-        O_8_random, B_8_random = Variable(O_8_random, requires_grad=False), Variable(B_8_random, requires_grad=False)
 
         print('file_name', batch['file_name'])
         out1, out2, out3, multiexit2, multiexit4 = self.net(O, O_2, O_4)
@@ -267,32 +250,28 @@ class Session:
         O, B = batch['O'].cuda(), batch['B'].cuda()
         O_2, B_2 = batch['O_2'].cuda(), batch['B_2'].cuda()
         O_4, B_4 = batch['O_4'].cuda(), batch['B_4'].cuda()
-        O_8, B_8 = batch['O_8'].cuda(), batch['B_8'].cuda()
         O, B = Variable(O, requires_grad=False), Variable(B, requires_grad=False)
         O_2, B_2 = Variable(O_2, requires_grad=False), Variable(B_2, requires_grad=False)
         O_4, B_4 = Variable(O_4, requires_grad=False), Variable(B_4, requires_grad=False)
-        O_8, B_8 = Variable(O_8, requires_grad=False), Variable(B_8, requires_grad=False)
 
         with torch.no_grad():
             out1, out2, out3, multiexit2, multiexit4 = self.net(O, O_2, O_4)
 
         l1_loss = self.l1(out1, B)
         ssim1 = self.ssim(out1, B)
-        psnr1 = PSNR(out1.data.cpu().numpy() * 255, B.data.cpu().numpy() * 255)
+        psnr1 = psnr(out1, B).item()
         losses = {'L1 loss': l1_loss}
         ssimes = {'ssim1': ssim1}
         losses.update(ssimes)
 
-        return l1_loss.data.cpu().numpy(), ssim1.data.cpu().numpy(), psnr1
+        return l1_loss.cpu().numpy(), ssim1.cpu().numpy(), psnr1
     def updating_dataset(self, batch, name, root_dir,epoch):
         O, B = batch['O'].cuda(), batch['B'].cuda()
         O_2, B_2 = batch['O_2'].cuda(), batch['B_2'].cuda()
         O_4, B_4 = batch['O_4'].cuda(), batch['B_4'].cuda()
-        O_8, B_8 = batch['O_8'].cuda(), batch['B_8'].cuda()
         O, B = Variable(O, requires_grad=False), Variable(B, requires_grad=False)
         O_2, B_2 = Variable(O_2, requires_grad=False), Variable(B_2, requires_grad=False)
         O_4, B_4 = Variable(O_4, requires_grad=False), Variable(B_4, requires_grad=False)
-        O_8, B_8 = Variable(O_8, requires_grad=False), Variable(B_8, requires_grad=False)
 
         with torch.no_grad():
             out1, out2, out3, multiexit2, multiexit4 = self.net(O, O_2, O_4)
@@ -5,6 +5,7 @@ import logging
 channel = 20
 unit = 6
 ssim_loss = True
+multiexit4_loss = True  # False drops the 0.001-weight 1/4 scale term and its backward; the branch's forward still runs
 ########################################################################################
 aug_data = False # Set as False for fair comparison
 
@@ -41,11 +42,18 @@ syn_test_data_dir = '/data/wangcong/dataset/rain100H/test'
 real_data_dir = '../real-world'
 
 batch_size = 1
+cuda_graph = True  # capture the training step as a CUDA graph, single GPU only
+graph_warmup = 3   # eager steps before capture
+channels_last = True  # NHWC activations for the cuDNN tensor-core kernels
+amp = True
+amp_dtype = 'bfloat16'  # 'float16' on pre-Ampere GPUs, adds a GradScaler and disables cuda_graph
+compile_net = False  # torch.compile the training net and ssim, replaces cuda_graph when set
 total_step_initial = int((500 * 1800)/12)
 epoch = 500 + real_epoch
 
 mat_files_training = os.listdir(syn_training_data_dir)
 num_training_datasets = len(mat_files_training)
+one_epoch = int(num_training_datasets/batch_size)
 l1 = int(3/5 * epoch * num_training_datasets / batch_size)
 l2 = int(4/5 * epoch * num_training_datasets / batch_size)
 l3 = total_step_initial
@@ -2,7 +2,6 @@ import os
 import sys
 import cv2
 import argparse
-import math
 import numpy as np
 import itertools
 
@@ -16,7 +15,7 @@ from torch.utils.data import DataLoader
 import settings
 from dataset import ShowDataset
 from model import ODE_DerainNet 
-from cal_ssim import SSIM
+from cal_ssim import SSIM, psnr
 
 os.environ['CUDA_VISIBLE_DEVICES'] = settings.device_id
 logger = settings.logger
@@ -29,18 +28,6 @@ def ensure_dir(dir_path):
     if not os.path.isdir(dir_path):
         os.makedirs(dir_path)
         
-def PSNR(img1, img2):
-    b,_,_,_=img1.shape
-    #mse=0
-    #for i in range(b):
-    img1=np.clip(img1,0,255)
-    img2=np.clip(img2,0,255)
-    mse = np.mean((img1/ 255. - img2/ 255.) ** 2)#+mse
-    if mse == 0:
-        return 100
-    #mse=mse/b
-    PIXEL_MAX = 1
-    return 20 * math.log10(PIXEL_MAX / math.sqrt(mse)) 
 
 class Session:
     def __init__(self):
@@ -107,11 +94,11 @@ class Session:
             comput_time = t1 - t0
             print(comput_time)
             ssim = self.ssim(out1, B).data.cpu().numpy()
-            psnr = PSNR(out1.data.cpu().numpy() * 255, B.data.cpu().numpy() * 255)
-            print('psnr:%4f-------------ssim:%4f'%(psnr, ssim))
-            return out1, psnr, ssim, file_name
+            psnr_val = psnr(out1, B).item()
+            print('psnr:%4f-------------ssim:%4f'%(psnr_val, ssim))
+            return out1, psnr_val, ssim, file_name
 
-    def save_image(self, No, imgs, name, psnr, ssim, file_name):
+    def save_image(self, No, imgs, name, psnr_val, ssim, file_name):
         for i, img in enumerate(imgs):
             img = (img.cpu().data * 255).numpy()
             img = np.clip(img, 0, 255)
@@ -136,8 +123,8 @@ def run_show(ckp_name):
     for i, batch in enumerate(dt):
         logger.info(i)
         if i>-1:
-            imgs,psnr,ssim, file_name= sess.inf_batch('test', batch,i)
-            sess.save_image(i, imgs, dataset, psnr, ssim, file_name)
+            imgs,psnr_val,ssim, file_name= sess.inf_batch('test', batch,i)
+            sess.save_image(i, imgs, dataset, psnr_val, ssim, file_name)
 
 
 
@@ -2,26 +2,32 @@ import os
 import sys
 import cv2
 import argparse
-import math
+from concurrent.futures import ThreadPoolExecutor
 
 import torch
 from torch import nn
+import torch.nn.functional as F
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel as DDP
 from torch.nn import MSELoss
 from torch.optim import Adam
 from torch.optim.lr_scheduler import MultiStepLR
-from torch.autograd import Variable
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, DistributedSampler
 from tensorboardX import SummaryWriter
 
 import settings
 from dataset import TrainValDataset, TestDataset
 from model import ODE_DerainNet
-from cal_ssim import SSIM
+from cal_ssim import SSIM, psnr
 
 logger = settings.logger
 os.environ['CUDA_VISIBLE_DEVICES'] = settings.device_id
 torch.cuda.manual_seed_all(66)
 torch.manual_seed(66)
+# training crops have a fixed size, so the autotuned conv algorithms are reused every step
+torch.backends.cudnn.benchmark = True
+torch.set_float32_matmul_precision('high')
 import numpy as np
 
 
@@ -29,19 +35,11 @@ def ensure_dir(dir_path):
     if not os.path.isdir(dir_path):
         os.makedirs(dir_path)
 
-def PSNR(img1, img2):
-    b,_,_,_=img1.shape
-    img1=np.clip(img1,0,255)
-    img2=np.clip(img2,0,255)
-    mse = np.mean((img1/ 255. - img2/ 255.) ** 2)
-    if mse == 0:
-        return 100
-
-    PIXEL_MAX = 1
-    return 20 * math.log10(PIXEL_MAX / math.sqrt(mse))        
-
 class Session:
-    def __init__(self):
+    def __init__(self, local_rank=0, world_size=1):
+        self.local_rank = local_rank
+        self.world_size = world_size
+        self.is_main = local_rank == 0
         self.log_dir = settings.log_dir
         self.model_dir = settings.model_dir
         self.ssim_loss = settings.ssim_loss
@@ -50,28 +48,90 @@ class Session:
         ensure_dir('../log_test')
         logger.info('set log dir as %s' % settings.log_dir)
         logger.info('set model dir as %s' % settings.model_dir)
-        if len(settings.device_id) >1:
-            self.net = nn.DataParallel(ODE_DerainNet()).cuda()
+        # one process per GPU, see run_train_val
+        torch.cuda.set_device(local_rank)
+        self.net = ODE_DerainNet().cuda()
+        if settings.channels_last:
+            self.memory_format = torch.channels_last
+            self.net = self.net.to(memory_format=self.memory_format)
         else:
-            torch.cuda.set_device(settings.device_id[0])
-            self.net = ODE_DerainNet().cuda()
+            self.memory_format = torch.contiguous_format
+        if world_size > 1:
+            # net13, Derain_Module.fusion2 and some Bottomupupbottom convs never get a gradient;
+            # the used set is the same every step, so a static graph lets the reducer skip them.
+            # the only buffers are constants, no need to broadcast them every forward
+            self.net = DDP(self.net, device_ids=[local_rank], static_graph=True, broadcast_buffers=False)
+            # validation only runs on rank 0, so it must bypass DDP's collectives
+            self.net_eval = self.net.module
+            self.use_graph = False
+        else:
+            self.net_eval = self.net
+            self.use_graph = settings.cuda_graph
+        binomial = torch.tensor([1., 4., 6., 4., 1.]) / 16
+        self.pyr_kernel = torch.outer(binomial, binomial).expand(3, 1, 5, 5).contiguous().cuda()
         self.l1 = nn.L1Loss().cuda()
         self.celoss = nn.CrossEntropyLoss().cuda()
+        if self.is_main:
+            self.print_network(self.net)
         self.ssim = SSIM().cuda()
+        if settings.compile_net:
+            # reduce-overhead replays through CUDA graphs itself; the first two steps compile.
+            # inf_batch_test keeps the eager modules so batch_size=1 does not trigger a recompile
+            self.net_train = torch.compile(self.net, mode='reduce-overhead', fullgraph=False)
+            self.ssim_train = torch.compile(self.ssim, mode='reduce-overhead', fullgraph=False)
+            self.use_graph = False
+        else:
+            self.net_train = self.net
+            self.ssim_train = self.ssim
+        self.amp_dtype = getattr(torch, settings.amp_dtype)
+        use_scaler = settings.amp and self.amp_dtype == torch.float16
+        if hasattr(torch.amp, 'GradScaler'):
+            self.scaler = torch.amp.GradScaler('cuda', enabled=use_scaler)
+        else:
+            # torch < 2.3 only has the cuda-specific class
+            self.scaler = torch.cuda.amp.GradScaler(enabled=use_scaler)
+        if self.scaler.is_enabled():
+            # the scaler's inf check syncs with the host and cannot be captured
+            self.use_graph = False
+        loss_weights = [-1., -1., -1., -0.05]
+        if settings.multiexit4_loss:
+            loss_weights.append(-0.001)
+        self.loss_weights = torch.tensor(loss_weights, device='cuda')
         self.step = 0
+        # each rank sees 1/world_size of the data per pass, so epochs are shorter in steps
+        self.one_epoch = settings.one_epoch // world_size
+        self.total_step = settings.total_step // world_size
         self.save_steps = settings.save_steps
         self.num_workers = settings.num_workers
         self.batch_size = settings.batch_size
         self.writers = {}
         self.dataloaders = {}
-        self.opt_net = Adam(self.net.parameters(), lr=settings.lr)
-        self.sche_net = MultiStepLR(self.opt_net, milestones=[settings.l1, settings.l2], gamma=0.1)
+        self.io_executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            self.opt_net = Adam(self.net.parameters(), lr=settings.lr, fused=True, capturable=self.use_graph)
+        except (TypeError, RuntimeError):
+            # torch without the fused kernel still has the multi-tensor path
+            self.opt_net = Adam(self.net.parameters(), lr=settings.lr, foreach=True, capturable=self.use_graph)
+        # l1/l2 are iteration counts, the scheduler is stepped at the start of each epoch, so
+        # last_epoch is k+1 during epoch k and the +1 makes the decay land at step ~l1 as before
+        self.sche_net = MultiStepLR(self.opt_net, milestones=[settings.l1 // settings.one_epoch + 1,
+                                                             settings.l2 // settings.one_epoch + 1], gamma=0.1)
+        self.graph = None
+        self.graph_lr = None
+        self.graph_calls = 0
+        self.static_inputs = None
+        self.static_outputs = None
        
     def tensorboard(self, name):
         self.writers[name] = SummaryWriter(os.path.join(self.log_dir, name + '.events'))
         return self.writers[name]
 
     def write(self, name, out):
+        if not self.is_main:
+            return
+        # a single device sync for all scalars instead of one per add_scalar/format
+        values = torch.stack([v.detach().float() for v in out.values()]).cpu().tolist()
+        out = dict(zip(out.keys(), values))
         for k, v in out.items():
             self.writers[name].add_scalar(k, v, self.step)
         out['lr'] = self.opt_net.param_groups[0]['lr']
@@ -83,16 +143,22 @@ class Session:
         logger.info(name + '--' + ' '.join(outputs))
 
     def get_dataloader(self, dataset_name):
-        dataset = TrainValDataset(dataset_name)
         if not dataset_name in self.dataloaders:
+            dataset = TrainValDataset(dataset_name, pyramid=False)
+            sampler = DistributedSampler(dataset, drop_last=True) if self.world_size > 1 else None
             self.dataloaders[dataset_name] = \
-                    DataLoader(dataset, batch_size=self.batch_size, 
-                            shuffle=True, num_workers=self.num_workers, drop_last=True)
-        return iter(self.dataloaders[dataset_name])
+                    DataLoader(dataset, batch_size=self.batch_size, sampler=sampler,
+                            shuffle=sampler is None, num_workers=self.num_workers, drop_last=True,
+                            pin_memory=True, persistent_workers=True, prefetch_factor=4)
+        dataloader = self.dataloaders[dataset_name]
+        if isinstance(dataloader.sampler, DistributedSampler):
+            # reshuffle on every epoch reset, the step is the same on all ranks
+            dataloader.sampler.set_epoch(self.step)
+        return iter(dataloader)
 
     def get_test_dataloader(self, dataset_name):
-        dataset = TestDataset(dataset_name)
         if not dataset_name in self.dataloaders:
+            dataset = TestDataset(dataset_name, pyramid=False)
             self.dataloaders[dataset_name] = \
                     DataLoader(dataset, batch_size=1, 
                             shuffle=False, num_workers=1, drop_last=False)
@@ -102,7 +168,8 @@ class Session:
         ckp_path = os.path.join(self.model_dir, name)
         obj = {
             'net': self.net.state_dict(),
-            'clock_net': self.step,
+            # global step so checkpoints resume on any number of GPUs
+            'clock_net': self.step * self.world_size,
             'opt_net': self.opt_net.state_dict(),
         }
         torch.save(obj, ckp_path)
@@ -111,14 +178,21 @@ class Session:
         ckp_path = os.path.join(self.model_dir, name)
         try:
             logger.info('Load checkpoint %s' % ckp_path)
-            obj = torch.load(ckp_path)
+            obj = torch.load(ckp_path, map_location='cuda:%d' % self.local_rank)
         except FileNotFoundError:
             logger.info('No checkpoint %s!!' % ckp_path)
             return
         self.net.load_state_dict(obj['net'])
+        # the saved groups carry the writing run's optimizer flags; keep this run's so that
+        # load_state_dict moves 'step' onto the device when the graph captures Adam
+        for saved, group in zip(obj['opt_net']['param_groups'], self.opt_net.param_groups):
+            for key in ('capturable', 'fused', 'foreach'):
+                if key in group:
+                    saved[key] = group[key]
         self.opt_net.load_state_dict(obj['opt_net'])
-        self.step = obj['clock_net']
-        self.sche_net.last_epoch = self.step
+        self.step = obj['clock_net'] // self.world_size
+        # epochs the scheduler has been stepped for by this step, run_train_val steps it at epoch starts
+        self.sche_net.last_epoch = (self.step + self.one_epoch - 1) // self.one_epoch
 
     def print_network(self, model):
         num_params = 0
@@ -127,35 +201,91 @@ class Session:
         print(model)
         print("The number of parameters: {}".format(num_params))
 
+    def to_cuda(self, t):
+        return t.cuda(non_blocking=True).contiguous(memory_format=self.memory_format)
+
+    def pyr_down(self, img):
+        # same as cv2.pyrDown on the workers: 5x5 binomial blur, reflect-101 border, stride 2
+        img = F.pad(img, (2, 2, 2, 2), mode='reflect')
+        img = F.conv2d(img, self.pyr_kernel, stride=2, groups=img.size(1))
+        return img.contiguous(memory_format=self.memory_format)
+
+    def forward_loss(self, O, O_2, O_4, B, B_2, B_4):
+        with torch.autocast('cuda', dtype=self.amp_dtype, enabled=settings.amp):
+            out1, out2, out3, multiexit2, multiexit4 = self.net_train(O, O_2, O_4)
+
+        # outputs are fp32 (input minus residual); SSIM stays out of autocast since
+        # E[x^2] - mu^2 cancels badly in half precision
+        B_stats = self.ssim.precompute_target(B)
+        ssim1 = self.ssim_train(out1, B_stats)
+        ssim2 = self.ssim_train(out2, B_stats)
+        ssim3 = self.ssim_train(out3, B_stats)
+
+        ssimmulti2 = self.ssim_train(multiexit2, B_2)
+
+        ssimes = [ssim1, ssim2, ssim3, ssimmulti2]
+        if settings.multiexit4_loss:
+            ssimes.append(self.ssim_train(multiexit4, B_4))
+        loss = torch.stack(ssimes) @ self.loss_weights
+        return out1, loss, ssim1, ssim2, ssim3
+
+    def train_step(self, O, O_2, O_4, B, B_2, B_4):
+        out1, loss, ssim1, ssim2, ssim3 = self.forward_loss(O, O_2, O_4, B, B_2, B_4)
+        self.scaler.scale(loss).backward()
+        self.scaler.step(self.opt_net)
+        self.scaler.update()
+        return out1, loss, ssim1, ssim2, ssim3
+
+    def graph_step(self, O, O_2, O_4, B, B_2, B_4):
+        inputs = (O, O_2, O_4, B, B_2, B_4)
+        if self.static_inputs is None:
+            self.static_inputs = [t.clone() for t in inputs]
+        else:
+            for static, t in zip(self.static_inputs, inputs):
+                static.copy_(t, non_blocking=True)
+
+        # Adam's lr is baked into the captured kernels, recapture when the scheduler changes it
+        lr = self.opt_net.param_groups[0]['lr']
+        if self.graph is not None and lr != self.graph_lr:
+            self.graph = None
+
+        if self.graph is None:
+            if self.graph_calls < settings.graph_warmup:
+                # warm-up has to run on a side stream before capture
+                stream = torch.cuda.Stream()
+                stream.wait_stream(torch.cuda.current_stream())
+                with torch.cuda.stream(stream):
+                    self.net.zero_grad(set_to_none=True)
+                    self.static_outputs = self.train_step(*self.static_inputs)
+                torch.cuda.current_stream().wait_stream(stream)
+                self.graph_calls += 1
+                return self.static_outputs
+
+            # grads are allocated inside the graph pool and overwritten on every replay
+            self.net.zero_grad(set_to_none=True)
+            self.graph = torch.cuda.CUDAGraph()
+            # thread_local: the DataLoader's pin-memory thread keeps allocating host memory meanwhile
+            with torch.cuda.graph(self.graph, capture_error_mode='thread_local'):
+                self.static_outputs = self.train_step(*self.static_inputs)
+            self.graph_lr = lr
+
+        self.graph.replay()
+        return self.static_outputs
+
     def inf_batch(self, name, batch):
-        if name == 'train':
-            self.net.zero_grad()
-        if self.step==0:
-            self.print_network(self.net)
+        # sample = {'O': O, 'B': B}, the 1/2 and 1/4 scales are built here on the GPU
 
-        # sample = {'O': O, 'B': B, 'O_2': O_2, 'O_4': O_4, 'O_8': O_8, 'B_2': B_2, 'B_4': B_4, 'B_8': B_8}
-
-        O, B = batch['O'].cuda(), batch['B'].cuda()
-        O_2, B_2 = batch['O_2'].cuda(), batch['B_2'].cuda()
-        O_4, B_4 = batch['O_4'].cuda(), batch['B_4'].cuda()
-        O_8, B_8 = batch['O_8'].cuda(), batch['B_8'].cuda()
-        O, B = Variable(O, requires_grad=False), Variable(B, requires_grad=False)
-        O_2, B_2 = Variable(O_2, requires_grad=False), Variable(B_2, requires_grad=False)
-        O_4, B_4 = Variable(O_4, requires_grad=False), Variable(B_4, requires_grad=False)
-        O_8, B_8 = Variable(O_8, requires_grad=False), Variable(B_8, requires_grad=False)
-        out1, out2, out3, multiexit2, multiexit4 = self.net(O, O_2, O_4)
-
-        ssim1 = self.ssim(out1, B)
-        ssim2 = self.ssim(out2, B)
-        ssim3 = self.ssim(out3, B)
-
-        ssimmulti2 = self.ssim(multiexit2, B_2)
-        ssimmulti4 = self.ssim(multiexit4, B_4)
-
-        loss = -ssim1 - ssim2 - ssim3 - 0.05*ssimmulti2 - 0.001*ssimmulti4
-        if name == 'train':
-            loss.backward()
-            self.opt_net.step()
+        O, B = self.to_cuda(batch['O']), self.to_cuda(batch['B'])
+        O_2, B_2 = self.pyr_down(O), self.pyr_down(B)
+        O_4, B_4 = self.pyr_down(O_2), self.pyr_down(B_2)
+
+        if name == 'train' and self.use_graph:
+            out1, loss, ssim1, ssim2, ssim3 = self.graph_step(O, O_2, O_4, B, B_2, B_4)
+        elif name == 'train':
+            self.net.zero_grad(set_to_none=True)
+            out1, loss, ssim1, ssim2, ssim3 = self.train_step(O, O_2, O_4, B, B_2, B_4)
+        else:
+            out1, loss, ssim1, ssim2, ssim3 = self.forward_loss(O, O_2, O_4, B, B_2, B_4)
         losses = {'L1loss2': loss}
         ssimes = {'ssim1': ssim1, 'ssim2': ssim2, 'ssim3': ssim3}
         losses.update(ssimes)
@@ -164,61 +294,51 @@ class Session:
         return out1
 
     def save_image(self, name, img_lists):
-        data, pred, label = img_lists
-        pred = pred.cpu().data
-
-        data, label, pred = data * 255, label * 255, pred * 255
+        data, pred, label = [t[0].detach().cpu().numpy() * 255 for t in img_lists]
         pred = np.clip(pred, 0, 255)
-        h, w = pred.shape[-2:]
-        gen_num = (1, 1)
-        img = np.zeros((gen_num[0] * h, gen_num[1] * 3 * w, 3))
-        for img_list in img_lists:
-            for i in range(gen_num[0]):
-                row = i * h
-                for j in range(gen_num[1]):
-                    idx = i * gen_num[1] + j
-                    tmp_list = [data[idx], pred[idx], label[idx]]
-                    for k in range(3):
-                        col = (j * 3 + k) * w
-                        tmp = np.transpose(tmp_list[k], (1, 2, 0))
-                        img[row: row+h, col: col+w] = tmp 
+        # with a 1x1 grid the image is just input | prediction | label of the first sample
+        img = np.concatenate([np.transpose(t, (1, 2, 0)) for t in (data, pred, label)], axis=1)
         img_file = os.path.join(self.log_dir, '%d_%s.jpg' % (self.step, name))
-        cv2.imwrite(img_file, img)
+        self.io_executor.submit(cv2.imwrite, img_file, img)
 
     def inf_batch_test(self, name, batch):
-        O, B = batch['O'].cuda(), batch['B'].cuda()
-        O_2, B_2 = batch['O_2'].cuda(), batch['B_2'].cuda()
-        O_4, B_4 = batch['O_4'].cuda(), batch['B_4'].cuda()
-        O_8, B_8 = batch['O_8'].cuda(), batch['B_8'].cuda()
-        O, B = Variable(O, requires_grad=False), Variable(B, requires_grad=False)
-        O_2, B_2 = Variable(O_2, requires_grad=False), Variable(B_2, requires_grad=False)
-        O_4, B_4 = Variable(O_4, requires_grad=False), Variable(B_4, requires_grad=False)
-        O_8, B_8 = Variable(O_8, requires_grad=False), Variable(B_8, requires_grad=False)
+        O, B = self.to_cuda(batch['O']), self.to_cuda(batch['B'])
+        O_2 = self.pyr_down(O)
+        O_4 = self.pyr_down(O_2)
 
         with torch.no_grad():
-            out1, out2, out3, multiexit2, multiexit4 = self.net(O, O_2, O_4)
+            out1, out2, out3, multiexit2, multiexit4 = self.net_eval(O, O_2, O_4)
 
         l1_loss = self.l1(out1, B)
-        ssim1 = self.ssim(out1, B)
-        ssim2 = self.ssim(out2, B)
-        ssim4 = self.ssim(out3, B)
-        psnr1 = PSNR(out1.data.cpu().numpy() * 255, B.data.cpu().numpy() * 255)
-        psnr2 = PSNR(out2.data.cpu().numpy() * 255, B.data.cpu().numpy() * 255)
-        psnr4 = PSNR(out3.data.cpu().numpy() * 255, B.data.cpu().numpy() * 255)
+        B_stats = self.ssim.precompute_target(B)
+        ssim1 = self.ssim(out1, B_stats)
+        ssim2 = self.ssim(out2, B_stats)
+        ssim4 = self.ssim(out3, B_stats)
+        B_clamp = B.clamp(0, 1)
+        psnr1 = psnr(out1, B_clamp, clamp_target=False)
+        psnr2 = psnr(out2, B_clamp, clamp_target=False)
+        psnr4 = psnr(out3, B_clamp, clamp_target=False)
         losses = {'L1 loss': l1_loss}
         ssimes = {'ssim1': ssim1,'ssim2': ssim2,'ssim4': ssim4}
         losses.update(ssimes)
 
-        return l1_loss.data.cpu().numpy(), ssim1.data.cpu().numpy(), psnr1, ssim2.data.cpu().numpy(), psnr2, ssim4.data.cpu().numpy(), psnr4
+        # device scalars, run_train_val accumulates them on the GPU
+        return l1_loss, ssim1, psnr1, ssim2, psnr2, ssim4, psnr4
 
 
-def run_train_val(ckp_name_net='latest_net'):
-    sess = Session()
+def run_train_val(local_rank, world_size, ckp_name_net='latest_net'):
+    if world_size > 1:
+        os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+        os.environ.setdefault('MASTER_PORT', '29500')
+        dist.init_process_group('nccl', rank=local_rank, world_size=world_size)
+    sess = Session(local_rank, world_size)
     sess.load_checkpoints_net(ckp_name_net)
-    sess.tensorboard('train')
+    if sess.is_main:
+        sess.tensorboard('train')
     dt_train = sess.get_dataloader('train')
-    while sess.step < settings.total_step+1:
-        sess.sche_net.step()
+    while sess.step < sess.total_step+1:
+        if sess.step % sess.one_epoch == 0:
+            sess.sche_net.step()
         sess.net.train()
         try:
             batch_t = next(dt_train)
@@ -226,44 +346,27 @@ def run_train_val(ckp_name_net='latest_net'):
             dt_train = sess.get_dataloader('train')
             batch_t = next(dt_train)
         pred_t = sess.inf_batch('train', batch_t)
-        if sess.step % int(sess.save_steps / 16) == 0:
+        # checkpoints, preview images and validation are rank 0 only
+        if sess.is_main and sess.step % int(sess.save_steps / 16) == 0:
             sess.save_checkpoints_net('latest_net')
-        if sess.step % sess.save_steps == 0:
+        if sess.is_main and sess.step % sess.save_steps == 0:
             sess.save_image('train', [batch_t['O'], pred_t, batch_t['B']])
 
         #observe tendency of ssim, psnr and loss
-        ssim1_all = 0
-        psnr1_all = 0
-        ssim2_all = 0
-        psnr2_all = 0
-        ssim4_all = 0
-        psnr4_all = 0
-        loss_all = 0
-        num_all = 0
-        if sess.step % (settings.one_epoch * 20) == 0:
+        if sess.is_main and sess.step % (sess.one_epoch * 20) == 0:
             dt_val = sess.get_test_dataloader('test')
             sess.net.eval()
+            # loss, ssim1, psnr1, ssim2, psnr2, ssim4, psnr4 summed on the GPU, synced once after the loop
+            val_all = torch.zeros(7, device='cuda')
+            num_all = 0
             for i, batch_v in enumerate(dt_val):
-                loss, ssim1, psnr1,ssim2, psnr2,ssim4, psnr4= sess.inf_batch_test('test', batch_v)
+                val_all += torch.stack(sess.inf_batch_test('test', batch_v))
                 print(i)
-                ssim1_all = ssim1_all + ssim1
-                psnr1_all = psnr1_all + psnr1
-                ssim2_all = ssim2_all + ssim2
-                psnr2_all = psnr2_all + psnr2
-                ssim4_all = ssim4_all + ssim4
-                psnr4_all = psnr4_all + psnr4
-                loss_all = loss_all + loss
                 num_all = num_all + 1
             print('num_all:',num_all)
-            loss_avg = loss_all / num_all
-            ssim1_avg = ssim1_all / num_all
-            psnr1_avg = psnr1_all / num_all
-            ssim2_avg = ssim2_all / num_all
-            psnr2_avg = psnr2_all / num_all
-            ssim4_avg = ssim4_all / num_all
-            psnr4_avg = psnr4_all / num_all
+            loss_avg, ssim1_avg, psnr1_avg, ssim2_avg, psnr2_avg, ssim4_avg, psnr4_avg = (val_all / num_all).tolist()
             logfile = open('../log_test/' + 'val' + '.txt','a+')
-            epoch = int(sess.step / settings.one_epoch)
+            epoch = int(sess.step / sess.one_epoch)
             logfile.write(
                 'step  = ' + str(sess.step) + '\t'
                 'epoch = ' + str(epoch) + '\t'
@@ -277,10 +380,13 @@ def run_train_val(ckp_name_net='latest_net'):
                 '\n\n'
             )
             logfile.close()
-        if sess.step % (settings.one_epoch*10) == 0:
-            sess.save_checkpoints_net('net_%d_epoch' % int(sess.step / settings.one_epoch))
-            logger.info('save model as net_%d_epoch' % int(sess.step / settings.one_epoch))
+        if sess.is_main and sess.step % (sess.one_epoch*10) == 0:
+            sess.save_checkpoints_net('net_%d_epoch' % int(sess.step / sess.one_epoch))
+            logger.info('save model as net_%d_epoch' % int(sess.step / sess.one_epoch))
         sess.step += 1
+    sess.io_executor.shutdown(wait=True)
+    if world_size > 1:
+        dist.destroy_process_group()
 
 
 
@@ -289,5 +395,9 @@ if __name__ == '__main__':
     parser.add_argument('-m1', '--model_1', default='latest_net')
 
     args = parser.parse_args(sys.argv[1:])
-    run_train_val(args.model_1)
+    world_size = len(settings.device_id.split(','))
+    if world_size > 1:
+        mp.spawn(run_train_val, args=(world_size, args.model_1), nprocs=world_size)
+    else:
+        run_train_val(0, 1, args.model_1)
 